@@ -1,31 +1,597 @@
+import asyncio
+import atexit
+import copy
+import hashlib
+import logging
+import logging.handlers
 import os
+import pickle
+import queue
+import re
+import shutil
+import stat
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Protocol
+from uuid import uuid4
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SERVICE_WORKERS = int(os.getenv("AI_SERVICE_WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+THREADS_PER_WORKER = max(1, (os.cpu_count() or 1) // SERVICE_WORKERS)
+
+os.environ.setdefault("OMP_NUM_THREADS", str(THREADS_PER_WORKER))
+os.environ.setdefault("MKL_NUM_THREADS", str(THREADS_PER_WORKER))
+
 import torch
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from dotenv import load_dotenv
 
-load_dotenv()
+torch.set_num_threads(THREADS_PER_WORKER)
 
 MODEL_NAME = "Qwen/Qwen2.5-1.5B-Instruct"
+AI_BACKEND = os.getenv("AI_BACKEND", "transformers")
+ONNX_MODEL_DIR = os.getenv("AI_ONNX_MODEL_DIR", "qwen2.5-onnx-int8")
+GGUF_MODEL_PATH = os.getenv("AI_GGUF_MODEL_PATH", "qwen2.5-1.5b-instruct-q4_k_m.gguf")
+CT2_MODEL_DIR = os.getenv("AI_CT2_MODEL_DIR", "qwen2.5-ct2-int8")
+PREFIX_CACHE_DIR = os.getenv(
+    "AI_PREFIX_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), f"ai_service-{os.getuid()}" if hasattr(os, "getuid") else "ai_service")
+)
+MAX_BATCH_SIZE = int(os.getenv("AI_MAX_BATCH_SIZE", "16"))
+BATCH_WAIT_TIMEOUT_S = float(os.getenv("AI_BATCH_WAIT_TIMEOUT_S", "0.02"))
+TORCH_COMPILE = os.getenv("AI_TORCH_COMPILE", "0") == "1"
+QUANTIZE_INT8 = os.getenv("AI_QUANTIZE", "") == "int8"
+
+SYSTEM_PROMPT = "You are a security analyst. Classify the log as 'NORMAL' or 'ANOMALOUS'. Rules: SQLi/XSS/Suspicious Time/Failed Login -> ANOMALOUS. Valid traffic -> NORMAL. Do not explain. Return one word only."
+USER_PROMPT_PREFIX = "Log entry: "
+LABELS = ("ANOMALOUS", "NORMAL")
+
+ANOMALY_PATTERN = re.compile(
+    "|".join([
+        r"' OR",
+        r"UNION\s+SELECT",
+        r"1=1",
+        r"--",
+        r"<script",
+        r"javascript:",
+        r"alert\(",
+        r"Too many failed attempts",
+        r"Failed login attempt",
+    ]),
+    re.IGNORECASE
+)
+TIME_PATTERN = re.compile(r"\bTime:\s*(\d{1,2}):\d{1,2}")
+SUSPICIOUS_HOURS = {23, 0, 1, 2, 3, 4}
+
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logger = logging.getLogger("ai")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.handlers.QueueHandler(log_queue))
+logger.propagate = False
+
+app = FastAPI(title="Log AI Service", version="4.0.0", default_response_class=ORJSONResponse)
+
+
+def build_messages(log_text: str) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"{USER_PROMPT_PREFIX}{log_text}\n\nClassification:"
+        }
+    ]
+
+
+def matches_anomaly_rule(log_text: str) -> bool:
+    if ANOMALY_PATTERN.search(log_text):
+        return True
+
+    time_match = TIME_PATTERN.search(log_text)
+    return time_match is not None and int(time_match.group(1)) in SUSPICIOUS_HOURS
 
-app = FastAPI(title="Log AI Service", version="4.0.0")
 
-try:
-    print(f"Loading model: {MODEL_NAME}...", flush=True)
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+def select_device_and_dtype() -> tuple[str, torch.dtype]:
+    if QUANTIZE_INT8:
+        return "cpu", torch.float32
+
+    if torch.cuda.is_available():
+        return "cuda", torch.float16
+
+    is_bf16_supported = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    if is_bf16_supported is not None and is_bf16_supported():
+        return "cpu", torch.bfloat16
+
+    return "cpu", torch.float32
+
+
+def quantize_model(model):
+    if "fbgemm" in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = "fbgemm"
+
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def build_model_dir(model_dir: str, build) -> None:
+    # Build into a staging dir next to the target and rename it into place, so
+    # a crashed build never looks finished and concurrent workers don't write
+    # into the same files; the first worker to finish wins the rename.
+    parent_dir = os.path.dirname(os.path.abspath(model_dir))
+    staging_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(model_dir)}-", dir=parent_dir)
+    try:
+        build(staging_dir)
+        try:
+            os.replace(staging_dir, model_dir)
+        except OSError:
+            if not os.path.isdir(model_dir):
+                raise
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def load_transformers_model():
+    from transformers import AutoModelForCausalLM
+
+    device, dtype = select_device_and_dtype()
+    logger.info("Using device=%s, dtype=%s", device, dtype)
     model = AutoModelForCausalLM.from_pretrained(
         MODEL_NAME,
-        device_map="cpu",
-        torch_dtype=torch.float32,
+        device_map=device,
+        torch_dtype=dtype,
         low_cpu_mem_usage=True,
         trust_remote_code=True
     )
-    print("Model loaded successfully!", flush=True)
-except Exception as e:
-    print(f"Error loading model: {str(e)}")
+    if QUANTIZE_INT8:
+        model = quantize_model(model)
+    if TORCH_COMPILE:
+        model.forward = torch.compile(model.forward, mode="reduce-overhead", dynamic=True, fullgraph=False)
+    return model
+
+
+def load_onnx_model():
+    from onnxruntime import SessionOptions
+    from optimum.onnxruntime import ORTModelForCausalLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if not os.path.isdir(ONNX_MODEL_DIR):
+        logger.info("Exporting %s to ONNX (INT8) in %s...", MODEL_NAME, ONNX_MODEL_DIR)
+
+        def export_and_quantize(save_dir: str) -> None:
+            export_dir = tempfile.mkdtemp(prefix=".onnx-fp32-", dir=os.path.dirname(save_dir))
+            try:
+                ORTModelForCausalLM.from_pretrained(MODEL_NAME, export=True).save_pretrained(export_dir)
+                quantizer = ORTQuantizer.from_pretrained(export_dir)
+                quantizer.quantize(
+                    save_dir=save_dir,
+                    quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+                )
+            finally:
+                shutil.rmtree(export_dir, ignore_errors=True)
+
+        build_model_dir(ONNX_MODEL_DIR, export_and_quantize)
+
+    session_options = SessionOptions()
+    session_options.intra_op_num_threads = THREADS_PER_WORKER
+    session_options.inter_op_num_threads = 1
+
+    return ORTModelForCausalLM.from_pretrained(
+        ONNX_MODEL_DIR,
+        file_name="model_quantized.onnx",
+        session_options=session_options
+    )
+
+
+def load_gguf_model():
+    from llama_cpp import Llama
+
+    return Llama(
+        model_path=GGUF_MODEL_PATH,
+        n_ctx=2048,
+        n_threads=THREADS_PER_WORKER,
+        n_batch=128,
+        verbose=False
+    )
+
+
+def load_vllm_engine():
+    from vllm import AsyncEngineArgs, AsyncLLMEngine
+
+    return AsyncLLMEngine.from_engine_args(
+        AsyncEngineArgs(
+            model=MODEL_NAME,
+            dtype="bfloat16",
+            max_model_len=1024,
+            enable_prefix_caching=True
+        )
+    )
+
+
+def load_ct2_generator():
+    import ctranslate2
+
+    if not os.path.isdir(CT2_MODEL_DIR):
+        logger.info("Converting %s to CTranslate2 (INT8) in %s...", MODEL_NAME, CT2_MODEL_DIR)
+        build_model_dir(
+            CT2_MODEL_DIR,
+            lambda save_dir: ctranslate2.converters.TransformersConverter(MODEL_NAME).convert(
+                save_dir, quantization="int8", force=True
+            )
+        )
+
+    return ctranslate2.Generator(
+        CT2_MODEL_DIR,
+        device="auto",
+        compute_type="int8",
+        intra_threads=THREADS_PER_WORKER,
+        inter_threads=1
+    )
+
+
+def prepare_prefix_cache_dir() -> bool:
+    try:
+        os.makedirs(PREFIX_CACHE_DIR, mode=0o700, exist_ok=True)
+        dir_stat = os.lstat(PREFIX_CACHE_DIR)
+    except OSError as e:
+        logger.error("Cannot use prefix cache dir %s, not caching the prompt prefix: %s", PREFIX_CACHE_DIR, e)
+        return False
+
+    # The cached KV tensors decide every classification, so only trust a real
+    # directory that this user owns and nobody else can write to.
+    if not stat.S_ISDIR(dir_stat.st_mode):
+        logger.error("Prefix cache path %s is not a directory, not caching the prompt prefix", PREFIX_CACHE_DIR)
+        return False
+    if hasattr(os, "getuid") and (dir_stat.st_uid != os.getuid() or dir_stat.st_mode & 0o077):
+        logger.error("Prefix cache dir %s must be owned by this user with mode 0700, not caching the prompt prefix", PREFIX_CACHE_DIR)
+        return False
+    return True
+
+
+def load_tokenizer():
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True)
+    if not tokenizer.is_fast:
+        logger.error("Fast tokenizer unavailable for %s, falling back to the slow Python tokenizer", MODEL_NAME)
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return tokenizer
+
+
+def build_label_tokens(tokenizer) -> dict[int, str]:
+    label_by_token = {
+        tokenizer(label, add_special_tokens=False).input_ids[0]: label for label in LABELS
+    }
+    if len(label_by_token) != len(LABELS):
+        raise ValueError(f"Labels {LABELS} do not start with distinct tokens")
+    return label_by_token
+
+
+def render_prompt(tokenizer, messages: list[dict]) -> str:
+    return tokenizer.apply_chat_template(
+        messages,
+        tokenize=False,
+        add_generation_prompt=True
+    )
+
+
+def build_prompt_prefix(tokenizer) -> str:
+    text = render_prompt(tokenizer, build_messages(""))
+    return text[:text.index(USER_PROMPT_PREFIX)]
+
+
+def build_prompt_suffix(tokenizer, prompt_prefix: str, log_text: str) -> str:
+    return render_prompt(tokenizer, build_messages(log_text))[len(prompt_prefix):]
+
+
+class Backend(Protocol):
+    async def classify(self, log_text: str) -> str:
+        ...
+
+
+class RegexBackend:
+    async def classify(self, log_text: str) -> str:
+        return "ANOMALOUS" if matches_anomaly_rule(log_text) else "NORMAL"
+
+
+class MicroBatchedBackend(ABC):
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue | None = None
+        self.batcher_task: asyncio.Task | None = None
+
+    @abstractmethod
+    def classify_batch(self, log_texts: list[str]) -> list[str]:
+        ...
+
+    async def classify(self, log_text: str) -> str:
+        if self.batcher_task is None:
+            self.queue = asyncio.Queue()
+            self.batcher_task = asyncio.create_task(self.server_loop())
+
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((log_text, future))
+        return await future
+
+    async def server_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + BATCH_WAIT_TIMEOUT_S
+
+            while len(batch) < MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                responses = await run_in_threadpool(self.classify_batch, [log_text for log_text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), response_text in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response_text)
+
+
+class CausalLMBackend(MicroBatchedBackend):
+    def __init__(self) -> None:
+        super().__init__()
+        self.tokenizer = load_tokenizer()
+        self.label_by_token = build_label_tokens(self.tokenizer)
+        self.label_token_ids = list(self.label_by_token)
+        self.model = self.load_model()
+
+    @abstractmethod
+    def load_model(self):
+        ...
+
+    def allowed_label_tokens(self, batch_id: int, input_ids: torch.Tensor) -> list[int]:
+        return self.label_token_ids
+
+    def build_inputs(self, log_texts: list[str]):
+        return self.tokenizer.apply_chat_template(
+            [build_messages(log_text) for log_text in log_texts],
+            add_generation_prompt=True,
+            padding=True,
+            return_dict=True,
+            return_tensors="pt"
+        ).to(self.model.device)
+
+    @torch.inference_mode()
+    def classify_batch(self, log_texts: list[str]) -> list[str]:
+        model_inputs = self.build_inputs(log_texts)
+
+        generated_ids = self.model.generate(
+            **model_inputs,
+            max_new_tokens=1,
+            prefix_allowed_tokens_fn=self.allowed_label_tokens,
+            do_sample=False
+        )
+
+        prompt_len = model_inputs["input_ids"].shape[1]
+        new_tokens = generated_ids[:, prompt_len].tolist()
+
+        return [self.label_by_token[token_id] for token_id in new_tokens]
+
+
+class OnnxBackend(CausalLMBackend):
+    def load_model(self):
+        return load_onnx_model()
+
+
+class TransformersBackend(CausalLMBackend):
+    def __init__(self) -> None:
+        super().__init__()
+        self.prompt_prefix = build_prompt_prefix(self.tokenizer)
+        self.prefix_ids, self.prefix_cache = self.build_prefix_cache()
+
+    def load_model(self):
+        return load_transformers_model()
+
+    def prefix_cache_path(self) -> str:
+        import transformers
+
+        model_revision = getattr(self.model.config, "_commit_hash", None)
+        cache_key = (
+            f"{MODEL_NAME}|{model_revision}|{transformers.__version__}|"
+            f"{self.model.dtype}|{QUANTIZE_INT8}|{self.prompt_prefix}"
+        )
+        digest = hashlib.sha256(cache_key.encode()).hexdigest()[:16]
+        return os.path.join(PREFIX_CACHE_DIR, f"ai_prefix_{digest}.pt")
+
+    def build_prefix_cache(self):
+        from transformers import DynamicCache
+
+        device = self.model.device
+        use_cache_file = prepare_prefix_cache_dir()
+        cache_path = self.prefix_cache_path()
+
+        # Workers share the prefill through one file: the first one to start
+        # writes it, the others map it read-only from the page cache.
+        if use_cache_file and os.path.exists(cache_path):
+            logger.info("Loading prompt prefix cache from %s", cache_path)
+            try:
+                cached = torch.load(cache_path, map_location="cpu", mmap=True, weights_only=True)
+                prefix_ids = cached["prefix_ids"].to(device)
+                prefix_cache = DynamicCache.from_legacy_cache(tuple(
+                    (key.to(device), value.to(device))
+                    for key, value in zip(cached["keys"], cached["values"])
+                ))
+                return prefix_ids, prefix_cache
+            except (OSError, RuntimeError, pickle.UnpicklingError, KeyError) as e:
+                logger.error("Ignoring unreadable prompt prefix cache %s: %s", cache_path, e)
+
+        prefix_ids = self.tokenizer(self.prompt_prefix, add_special_tokens=False, return_tensors="pt").input_ids.to(device)
+        with torch.inference_mode():
+            prefix_cache = self.model(prefix_ids, use_cache=True).past_key_values
+
+        if not use_cache_file:
+            return prefix_ids, prefix_cache
+
+        layers = prefix_cache.to_legacy_cache()
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            torch.save(
+                {
+                    "prefix_ids": prefix_ids.cpu(),
+                    "keys": [key.cpu() for key, _ in layers],
+                    "values": [value.cpu() for _, value in layers]
+                },
+                tmp_path
+            )
+            os.replace(tmp_path, cache_path)
+        except (OSError, RuntimeError) as e:
+            logger.error("Could not save prompt prefix cache to %s: %s", cache_path, e)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+        return prefix_ids, prefix_cache
+
+    def build_inputs(self, log_texts: list[str]) -> dict:
+        batch_size = len(log_texts)
+        suffix_inputs = self.tokenizer(
+            [build_prompt_suffix(self.tokenizer, self.prompt_prefix, log_text) for log_text in log_texts],
+            padding=True,
+            add_special_tokens=False,
+            return_tensors="pt"
+        ).to(self.model.device)
+
+        # Left padding of the suffixes ends up between the cached prefix and the
+        # log text; the attention mask hides it and position ids follow the mask.
+        input_ids = torch.cat([self.prefix_ids.expand(batch_size, -1), suffix_inputs.input_ids], dim=1)
+        attention_mask = torch.cat(
+            [torch.ones_like(self.prefix_ids).expand(batch_size, -1), suffix_inputs.attention_mask],
+            dim=1
+        )
+
+        past_key_values = copy.deepcopy(self.prefix_cache)
+        if batch_size > 1:
+            past_key_values.batch_repeat_interleave(batch_size)
+
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "past_key_values": past_key_values}
+
+
+class CTranslate2Backend(MicroBatchedBackend):
+    def __init__(self) -> None:
+        super().__init__()
+        self.tokenizer = load_tokenizer()
+        self.label_by_token = build_label_tokens(self.tokenizer)
+        self.label_token_ids = list(self.label_by_token)
+        self.generator = load_ct2_generator()
+        self.prompt_prefix = build_prompt_prefix(self.tokenizer)
+        self.static_prompt_tokens = self.tokenizer.convert_ids_to_tokens(
+            self.tokenizer(self.prompt_prefix, add_special_tokens=False).input_ids
+        )
+
+    def classify_batch(self, log_texts: list[str]) -> list[str]:
+        suffix_ids = self.tokenizer(
+            [build_prompt_suffix(self.tokenizer, self.prompt_prefix, log_text) for log_text in log_texts],
+            add_special_tokens=False
+        ).input_ids
+        results = self.generator.generate_batch(
+            [self.tokenizer.convert_ids_to_tokens(ids) for ids in suffix_ids],
+            static_prompt=self.static_prompt_tokens,
+            max_length=1,
+            sampling_topk=1,
+            include_prompt_in_result=False,
+            return_logits_vocab=True
+        )
+
+        # CTranslate2 cannot restrict the vocabulary, so pick the higher-scoring
+        # label token from the first step's logits instead of the free decode.
+        labels = []
+        for result in results:
+            step_logits = torch.as_tensor(result.logits[0][0])
+            label_scores = step_logits[self.label_token_ids]
+            labels.append(self.label_by_token[self.label_token_ids[int(label_scores.argmax())]])
+        return labels
+
+
+class LlamaCppBackend(MicroBatchedBackend):
+    def __init__(self) -> None:
+        from llama_cpp import LlamaGrammar
+
+        super().__init__()
+        self.llm = load_gguf_model()
+        self.label_grammar = LlamaGrammar.from_string(
+            "root ::= " + " | ".join(f'"{label}"' for label in LABELS),
+            verbose=False
+        )
+
+    def classify_batch(self, log_texts: list[str]) -> list[str]:
+        responses = []
+        for log_text in log_texts:
+            completion = self.llm.create_chat_completion(
+                messages=build_messages(log_text),
+                max_tokens=5,
+                temperature=0.0,
+                grammar=self.label_grammar
+            )
+            responses.append(completion["choices"][0]["message"]["content"].strip())
+        return responses
+
+
+class VLLMBackend:
+    def __init__(self) -> None:
+        from vllm import SamplingParams
+
+        self.tokenizer = load_tokenizer()
+        self.label_by_token = build_label_tokens(self.tokenizer)
+        self.engine = load_vllm_engine()
+        self.sampling_params = SamplingParams(
+            max_tokens=1,
+            temperature=0.0,
+            allowed_token_ids=list(self.label_by_token)
+        )
+
+    async def classify(self, log_text: str) -> str:
+        prompt = render_prompt(self.tokenizer, build_messages(log_text))
+
+        final_output = None
+        async for output in self.engine.generate(prompt, self.sampling_params, request_id=uuid4().hex):
+            final_output = output
+
+        return self.label_by_token[final_output.outputs[0].token_ids[0]]
+
+
+BACKENDS: dict[str, type] = {
+    "regex": RegexBackend,
+    "transformers": TransformersBackend,
+    "onnx": OnnxBackend,
+    "ctranslate2": CTranslate2Backend,
+    "llamacpp": LlamaCppBackend,
+    "vllm": VLLMBackend,
+}
+
+if AI_BACKEND not in BACKENDS:
+    logger.error("Unknown AI_BACKEND %r, expected one of: %s", AI_BACKEND, ", ".join(BACKENDS))
     exit(1)
 
+backend: Backend | None = None
+
 
 class AnalyzeRequest(BaseModel):
     log_text: str
@@ -35,48 +601,40 @@ class AnalyzeResponse(BaseModel):
     classification: str
 
 
-@app.post("/analyze", response_model=AnalyzeResponse)
-def analyze_log(request: AnalyzeRequest) -> AnalyzeResponse:
+@app.on_event("startup")
+async def load_backend() -> None:
+    global backend
+
     try:
-        messages = [
-            {
-                "role": "system",
-                "content": "You are a security analyst. Classify the log as 'NORMAL' or 'ANOMALOUS'. Rules: SQLi/XSS/Suspicious Time/Failed Login -> ANOMALOUS. Valid traffic -> NORMAL. Do not explain. Return one word only."
-            },
-            {
-                "role": "user",
-                "content": f"Log entry: {request.log_text}\n\nClassification:"
-            }
-        ]
-
-        text = tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True
-        )
+        logger.info("Loading backend: %s (%s)...", AI_BACKEND, MODEL_NAME)
+        backend = BACKENDS[AI_BACKEND]()
+        logger.info("Backend loaded successfully!")
 
-        model_inputs = tokenizer([text], return_tensors="pt").to(model.device)
+        logger.info("Warming up model...")
+        await backend.classify("warm-up")
+        logger.info("Model warm-up complete")
+    except Exception as e:
+        logger.error("Error loading backend %s: %s", AI_BACKEND, e)
+        exit(1)
 
-        generated_ids = model.generate(
-            model_inputs.input_ids,
-            max_new_tokens=5,
-            do_sample=False
-        )
 
-        generated_ids = [
-            output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
-        ]
+@app.post("/analyze", response_model=AnalyzeResponse)
+async def analyze_log(request: AnalyzeRequest) -> AnalyzeResponse:
+    try:
+        if matches_anomaly_rule(request.log_text):
+            logger.info("[AI] Matched anomaly rule, skipping model")
+            return AnalyzeResponse(classification="ANOMALOUS")
 
-        response_text = tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0].strip().upper()
-        
-        print(f"[AI] Raw Output: {response_text}", flush=True)
+        response_text = await backend.classify(request.log_text)
+
+        logger.info("[AI] Raw Output: %s", response_text)
 
         classification = "ANOMALOUS" if "ANOMALOUS" in response_text else "NORMAL"
         
         return AnalyzeResponse(classification=classification)
 
     except Exception as e:
-        print(f"Error processing log: {str(e)}", flush=True)
+        logger.error("Error processing log: %s", e)
         return AnalyzeResponse(classification="NORMAL")
 
 
@@ -84,4 +642,4 @@ if __name__ == "__main__":
     import uvicorn
     host = os.getenv("AI_SERVICE_HOST", "127.0.0.1")
     port = int(os.getenv("AI_SERVICE_PORT", "8001"))
-    uvicorn.run(app, host=host, port=port)
\ No newline at end of file
+    uvicorn.run("log_ai_service:app", host=host, port=port, workers=SERVICE_WORKERS)
\ No newline at end of file